@@ -1,6 +1,6 @@
 import os
 import shutil
-from PIL import Image
+from PIL import Image, ImageTk, ExifTags
 from datetime import datetime
 import re
 import logging
@@ -10,22 +10,50 @@ import threading
 import csv
 from concurrent.futures import ThreadPoolExecutor
 import json
+import io
+import glob
+import sqlite3
+import tempfile
+import hashlib
+from itertools import islice, count
+import queue
+from collections import deque, OrderedDict
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
 
 # --- Fonctions Existantes et Améliorées ---
 SUPPORTED_IMAGE_TYPES = ('.jpg', '.jpeg', '.png', '.tiff', '.bmp', '.gif')
 SUPPORTED_VIDEO_TYPES = ('.mp4', '.mov', '.avi')
 SUPPORTED_TYPES = SUPPORTED_IMAGE_TYPES + SUPPORTED_VIDEO_TYPES
 
+# Journal dédié aux lignes émises pour chaque fichier (échantillonnées, voir configurer_logging)
+journal_fichiers = logging.getLogger('tri_photos.fichiers')
+
 def extraire_infos_exif(chemin_fichier):
+    return extraire_metadonnees(chemin_fichier)['date_prise']
+
+def convertir_coordonnee(valeur, reference):
+    degres, minutes, secondes = (float(v) for v in valeur)
+    coordonnee = degres + minutes / 60 + secondes / 3600
+    return -coordonnee if reference in ('S', 'W') else coordonnee
+
+def extraire_metadonnees(chemin_fichier):
+    # Une seule ouverture du fichier pour la date, l'appareil et la position GPS
+    metadonnees = {'date_prise': None, 'appareil': None, 'latitude': None, 'longitude': None}
     try:
-        image = Image.open(chemin_fichier)
-        info_exif = image.getexif()
-        date_prise = info_exif.get(36867)  # DateTimeOriginal
-        if date_prise:
-            return datetime.strptime(date_prise, '%Y:%m:%d %H:%M:%S')
+        with Image.open(chemin_fichier) as image:
+            info_exif = image.getexif()
+            # DateTimeOriginal se trouve normalement dans le sous-IFD Exif, parfois directement dans IFD0
+            date_prise = info_exif.get(36867) or info_exif.get_ifd(0x8769).get(36867)
+            if date_prise:
+                metadonnees['date_prise'] = datetime.strptime(date_prise, '%Y:%m:%d %H:%M:%S')
+            metadonnees['appareil'] = info_exif.get(272)  # Model
+            gps_info = info_exif.get_ifd(0x8825)  # GPSInfo
+            if 2 in gps_info and 4 in gps_info:
+                metadonnees['latitude'] = convertir_coordonnee(gps_info[2], gps_info.get(1))
+                metadonnees['longitude'] = convertir_coordonnee(gps_info[4], gps_info.get(3))
     except Exception as e:
         logging.error(f"Erreur EXIF pour {chemin_fichier} : {e}")
-    return None
+    return metadonnees
 
 def extraire_date_nom_fichier(nom_fichier):
     match = re.search(r'(IMG|VID)_(\d{4})(\d{2})(\d{2})_(\d{2})(\d{2})(\d{2})', nom_fichier)
@@ -41,16 +69,22 @@ def formater_nom_fichier(date_prise, nom_fichier_original, format_nom='%Y_%m_%d_
     extension = os.path.splitext(nom_fichier_original)[1]
     return f"{date_prise.strftime(format_nom)}{extension}" if date_prise else None
 
-def gerer_doublons(chemin, dossier_cible):
-    if os.path.exists(chemin):
+verrou_doublons = threading.Lock()
+
+def gerer_doublons(chemin, dossier_cible, reserves=None):
+    # Sans ensemble de réservations, seul le disque est consulté (comportement historique)
+    if reserves is None:
+        reserves = set()
+    # Le verrou garantit que deux workers ne réservent jamais le même nom
+    with verrou_doublons:
         base, extension = os.path.splitext(chemin)
-        compteur = 1
-        nouveau_chemin = f"{base}_{compteur}{extension}"
-        while os.path.exists(nouveau_chemin):
+        compteur = 0
+        nouveau_chemin = chemin
+        while nouveau_chemin in reserves or os.path.exists(nouveau_chemin):
             compteur += 1
             nouveau_chemin = f"{base}_{compteur}{extension}"
+        reserves.add(nouveau_chemin)
         return nouveau_chemin
-    return chemin
 
 def filtrer_fichier(chemin_fichier, min_taille, min_resolution):
     taille = os.path.getsize(chemin_fichier) / (1024 * 1024)  # Taille en Mo
@@ -72,41 +106,48 @@ def optimiser_image(chemin_fichier, chemin_destination, taille_max=(1920, 1080))
     try:
         with Image.open(chemin_fichier) as img:
             img.thumbnail(taille_max)
-            img.save(chemin_destination, optimize=True, quality=85)
-        logging.info(f"Optimisé : {chemin_fichier} vers {chemin_destination}")
+            # Conserver les métadonnées EXIF (date de prise, GPS) dans l'image optimisée
+            img.save(chemin_destination, optimize=True, quality=85, exif=img.getexif())
+        journal_fichiers.info("Optimisé : %s vers %s", chemin_fichier, chemin_destination)
+        return True
     except Exception as e:
         logging.error(f"Erreur lors de l'optimisation de {chemin_fichier} : {e}")
+        return False
 
 def exporter_exif(dossier_sortie, fichier_csv):
-    with open(fichier_csv, 'w', newline='', encoding='utf-8') as csvfile:
-        fieldnames = ['Nom Fichier', 'Date Prise', 'Appareil', 'GPS']
-        writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
-        writer.writeheader()
-        for racine, _, fichiers in os.walk(dossier_sortie):
-            for fichier in fichiers:
-                chemin = os.path.join(racine, fichier)
-                exif = extraire_infos_exif(chemin)
-                appareil = "N/A"
-                gps = "N/A"
-                try:
-                    image = Image.open(chemin)
-                    info_exif = image.getexif()
-                    appareil = info_exif.get(272, "N/A")  # Model
-                    # Extraction GPS simplifiée
-                    gps_info = info_exif.get(34853)
-                    if gps_info:
-                        gps = str(gps_info)
-                except Exception as e:
-                    logging.error(f"Erreur lors de l'extraction des métadonnées pour {chemin} : {e}")
+    # Le catalogue est resynchronisé (seuls les dossiers modifiés sont relus) puis simplement interrogé
+    catalogue = Catalogue(dossier_sortie)
+    try:
+        # L'export n'a pas besoin des empreintes : elles restent à compléter par une synchronisation
+        synchroniser_catalogue(dossier_sortie, catalogue, completer_hash=False)
+        with open(fichier_csv, 'w', newline='', encoding='utf-8') as csvfile:
+            fieldnames = ['Nom Fichier', 'Date Prise', 'Appareil', 'GPS']
+            writer = csv.DictWriter(csvfile, fieldnames=fieldnames)
+            writer.writeheader()
+            lignes = catalogue.connexion.execute(
+                'SELECT nom, date_prise, appareil, latitude, longitude FROM photos ORDER BY chemin'
+            )
+            for nom, date_prise, appareil, latitude, longitude in lignes:
                 writer.writerow({
-                    'Nom Fichier': fichier,
-                    'Date Prise': exif.strftime('%Y-%m-%d %H:%M:%S') if exif else '',
-                    'Appareil': appareil,
-                    'GPS': gps
+                    'Nom Fichier': nom,
+                    'Date Prise': date_prise or '',
+                    'Appareil': appareil or "N/A",
+                    'GPS': f"{latitude:.6f}, {longitude:.6f}" if latitude is not None else "N/A"
                 })
+    finally:
+        catalogue.fermer()
+
+def formater_rapport(total_fichiers, fichiers_deplaces, fichiers_autres, erreurs):
+    return (
+        f"Total de fichiers traités : {total_fichiers}\n"
+        f"Fichiers déplacés : {fichiers_deplaces}\n"
+        f"Fichiers dans 'Autres' : {fichiers_autres}\n"
+        f"Erreurs : {erreurs}\n"
+    )
 
 def trier_photos(dossier_entree, dossier_sortie, format_nom='%Y_%m_%d_%H%M%S', dry_run=False, progress_callback=None,
-                min_taille=0, min_resolution=None, exporter_csv=False, optimiser=False):
+                min_taille=0, min_resolution=None, exporter_csv=False, optimiser=False, fichier_plan=None,
+                avec_hash=False, reserves=None, statistiques=None, cataloguer=True):
     os.makedirs(dossier_sortie, exist_ok=True)
     dossier_autres = os.path.join(dossier_sortie, "Autres")
     os.makedirs(dossier_autres, exist_ok=True)
@@ -118,35 +159,56 @@ def trier_photos(dossier_entree, dossier_sortie, format_nom='%Y_%m_%d_%H%M%S', d
             fichiers.append(os.path.join(racine, fichier))
     
     total_fichiers = len(fichiers)
-    fichiers_deplaces = 0
-    fichiers_autres = 0
-    erreurs = 0
+    compteurs = {'deplace': 0, 'autres': 0, 'erreur': 0}
+    operations_planifiees = 0
+
+    # Noms de destination déjà attribués pendant ce tri (partagés entre les workers, voire entre les travaux)
+    if reserves is None:
+        reserves = set()
+    
+    # En mode aperçu, le plan est écrit au fur et à mesure pour être appliqué plus tard
+    if dry_run and fichier_plan is None:
+        fichier_plan = os.path.join(dossier_sortie, PLAN_FILE)
+    plan = open(fichier_plan, 'w', encoding='utf-8') if dry_run else None
+    if plan:
+        # En-tête du plan : la bibliothèque dans laquelle le plan sera catalogué une fois appliqué
+        plan.write(json.dumps({'bibliotheque': os.path.abspath(dossier_sortie)}, ensure_ascii=False) + "\n")
+    # Sinon, chaque fichier déplacé est enregistré dans le catalogue de la bibliothèque
+    catalogue = Catalogue(dossier_sortie) if cataloguer and not dry_run else None
 
     # Utilisation de ThreadPoolExecutor pour le traitement en parallèle
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = []
-        for idx, chemin_complet in enumerate(fichiers, start=1):
-            futures.append(executor.submit(process_file, chemin_complet, dossier_sortie, format_nom, dry_run,
-                                           min_taille, min_resolution, optimiser))
-        
-        for idx, future in enumerate(futures, start=1):
-            result = future.result()
-            if result == 'deplace':
-                fichiers_deplaces += 1
-            elif result == 'autres':
-                fichiers_autres += 1
-            elif result == 'erreur':
-                erreurs += 1
-            # Mettre à jour la progression
-            if progress_callback:
-                progress_callback(idx, total_fichiers)
+    try:
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = []
+            for idx, chemin_complet in enumerate(fichiers, start=1):
+                futures.append(executor.submit(process_file, chemin_complet, dossier_sortie, format_nom, dry_run,
+                                               min_taille, min_resolution, optimiser, reserves, avec_hash))
+            
+            for idx, future in enumerate(futures, start=1):
+                entree = future.result()
+                if entree is not None and dry_run:
+                    plan.write(json.dumps(entree, ensure_ascii=False) + "\n")
+                    operations_planifiees += 1
+                elif entree is not None:
+                    compteurs[entree['resultat']] += 1
+                    if catalogue and entree['resultat'] != 'erreur':
+                        catalogue.ajouter(entree)
+                # Mettre à jour la progression
+                if progress_callback:
+                    progress_callback(idx, total_fichiers)
+    finally:
+        if plan:
+            plan.close()
+        if catalogue:
+            catalogue.fermer()
     
-    rapport = (
-        f"Total de fichiers traités : {total_fichiers}\n"
-        f"Fichiers déplacés : {fichiers_deplaces}\n"
-        f"Fichiers dans 'Autres' : {fichiers_autres}\n"
-        f"Erreurs : {erreurs}\n"
-    )
+    fichiers_deplaces, fichiers_autres, erreurs = compteurs['deplace'], compteurs['autres'], compteurs['erreur']
+    if statistiques is not None:
+        statistiques.update(total=total_fichiers, deplaces=fichiers_deplaces, autres=fichiers_autres, erreurs=erreurs)
+    rapport = formater_rapport(total_fichiers, fichiers_deplaces, fichiers_autres, erreurs)
+    if dry_run:
+        rapport += f"Opérations planifiées : {operations_planifiees}\n"
+        rapport += f"Plan enregistré vers : {fichier_plan}\n"
     logging.info("Tri terminé.\n" + rapport)
     
     if exporter_csv:
@@ -156,58 +218,701 @@ def trier_photos(dossier_entree, dossier_sortie, format_nom='%Y_%m_%d_%H%M%S', d
     
     return rapport
 
-def process_file(chemin_complet, dossier_sortie, format_nom, dry_run, min_taille, min_resolution, optimiser):
+def process_file(chemin_complet, dossier_sortie, format_nom, dry_run, min_taille, min_resolution, optimiser,
+                 reserves=None, avec_hash=False):
+    # En mode aperçu, l'entrée du plan est retournée sans être exécutée ; None si le fichier est filtré
+    entree = planifier_fichier(chemin_complet, dossier_sortie, format_nom, min_taille, min_resolution, optimiser,
+                               reserves, empreinte=dry_run, avec_hash=avec_hash)
+    if entree is None:
+        return None
+    if dry_run:
+        journal_fichiers.info("Simulé : déplacer %s vers %s", entree['source'], entree['destination'])
+    else:
+        entree['resultat'] = appliquer_entree(entree)
+    return entree
+
+# --- Plan de Tri (Aperçu puis Application) ---
+PLAN_FILE = 'plan_tri.jsonl'
+APPLIED_PLAN_SUFFIX = '.applique'
+
+def calculer_hash(chemin_fichier, taille_bloc=1024 * 1024):
+    sha1 = hashlib.sha1()
+    with open(chemin_fichier, 'rb') as f:
+        for bloc in iter(lambda: f.read(taille_bloc), b''):
+            sha1.update(bloc)
+    return sha1.hexdigest()
+
+def calculer_empreinte(chemin_fichier, avec_hash=False):
+    stat = os.stat(chemin_fichier)
+    empreinte = {'taille': stat.st_size, 'mtime': stat.st_mtime_ns}
+    if avec_hash:
+        empreinte['hash'] = calculer_hash(chemin_fichier)
+    return empreinte
+
+def planifier_fichier(chemin_complet, dossier_sortie, format_nom, min_taille, min_resolution, optimiser,
+                      reserves=None, empreinte=False, avec_hash=False):
     fichier = os.path.basename(chemin_complet)
     
     # Filtrage
     if not filtrer_fichier(chemin_complet, min_taille, min_resolution):
-        logging.info(f"Filtré : {chemin_complet}")
-        return 'filtré'
+        journal_fichiers.info("Filtré : %s", chemin_complet)
+        return None
     
     # Vérifier le type de fichier supporté
     _, extension = os.path.splitext(fichier)
     if extension.lower() not in SUPPORTED_TYPES:
-        logging.info(f"Type de fichier non supporté : {chemin_complet}")
-        return 'filtré'
+        journal_fichiers.info("Type de fichier non supporté : %s", chemin_complet)
+        return None
     
-    date_prise = extraire_infos_exif(chemin_complet) or extraire_date_nom_fichier(fichier)
+    metadonnees = extraire_metadonnees(chemin_complet)
+    date_prise = metadonnees['date_prise'] or extraire_date_nom_fichier(fichier)
     
     if date_prise:
         dossier_cible = os.path.join(dossier_sortie, str(date_prise.year), f"{date_prise.month:02}")
-        if not dry_run:
-            os.makedirs(dossier_cible, exist_ok=True)
         nouveau_nom = formater_nom_fichier(date_prise, fichier, format_nom)
-        chemin_nouveau_fichier = os.path.join(dossier_cible, nouveau_nom)
-        chemin_nouveau_fichier = gerer_doublons(chemin_nouveau_fichier, dossier_cible)
+        categorie = 'deplace'
+    else:
+        dossier_cible = os.path.join(dossier_sortie, "Autres")
+        nouveau_nom = fichier
+        categorie = 'autres'
+    chemin_nouveau_fichier = gerer_doublons(os.path.join(dossier_cible, nouveau_nom), dossier_cible, reserves)
+    
+    entree = {
+        'source': chemin_complet,
+        'destination': chemin_nouveau_fichier,
+        'categorie': categorie,
+        'optimiser': bool(optimiser and categorie == 'deplace' and extension.lower() in SUPPORTED_IMAGE_TYPES),
+        'date_prise': date_prise.strftime('%Y-%m-%d %H:%M:%S') if date_prise else None,
+    }
+    # Métadonnées conservées pour le catalogue, afin que l'application d'un plan n'ait rien à relire
+    for cle in ('appareil', 'latitude', 'longitude'):
+        if metadonnees[cle] is not None:
+            entree[cle] = metadonnees[cle]
+    if empreinte:
+        entree.update(calculer_empreinte(chemin_complet, avec_hash))
+    return entree
+
+def verifier_empreinte(entree):
+    if 'taille' not in entree:
+        return True
+    stat = os.stat(entree['source'])
+    if stat.st_size != entree['taille'] or stat.st_mtime_ns != entree['mtime']:
+        return False
+    if 'hash' in entree and calculer_hash(entree['source']) != entree['hash']:
+        return False
+    return True
+
+def appliquer_entree(entree, dossiers_crees=None):
+    source = entree['source']
+    destination = entree['destination']
+    try:
+        if not verifier_empreinte(entree):
+            logging.error(f"Fichier modifié depuis la planification : {source}")
+            return 'erreur'
+        # Ne jamais écraser un fichier apparu depuis la planification
+        if os.path.exists(destination):
+            logging.error(f"Destination déjà existante pour {source} : {destination}")
+            return 'erreur'
+        dossier_cible = os.path.dirname(destination)
+        if dossiers_crees is None or dossier_cible not in dossiers_crees:
+            os.makedirs(dossier_cible, exist_ok=True)
+            if dossiers_crees is not None:
+                dossiers_crees.add(dossier_cible)
+        if entree.get('optimiser'):
+            # Optimiser l'image directement vers la destination ; l'original n'est retiré qu'en cas de succès
+            if not optimiser_image(source, destination) or not os.path.exists(destination):
+                if os.path.exists(destination):
+                    os.remove(destination)
+                return 'erreur'
+            os.remove(source)
+        else:
+            shutil.move(source, destination)
+        if entree['categorie'] == 'autres':
+            journal_fichiers.info("Déplacé dans 'Autres' : %s", source)
+        else:
+            journal_fichiers.info("Déplacé : %s vers %s", source, destination)
+        return entree['categorie']
+    except Exception as e:
+        logging.error(f"Erreur lors du déplacement de {source} : {e}")
+        return 'erreur'
+
+def lire_plan(fichier_plan):
+    with open(fichier_plan, 'r', encoding='utf-8') as f:
+        for ligne in f:
+            if ligne.strip():
+                entree = json.loads(ligne)
+                # L'en-tête n'est pas une opération
+                if 'source' in entree:
+                    yield entree
+
+def lire_entete_plan(fichier_plan):
+    with open(fichier_plan, 'r', encoding='utf-8') as f:
+        for ligne in f:
+            if ligne.strip():
+                entete = json.loads(ligne)
+                return entete if 'bibliotheque' in entete else None
+    return None
+
+def appliquer_plan(fichier_plan, progress_callback=None, max_workers=8, taille_lot=1000, cataloguer=True):
+    # Compter les opérations sans charger le plan entier en mémoire
+    with open(fichier_plan, 'r', encoding='utf-8') as f:
+        total_fichiers = sum(1 for ligne in f if ligne.strip())
+    entete = lire_entete_plan(fichier_plan)
+    if entete:
+        total_fichiers -= 1
+    # Les plans sans en-tête (plus anciens) étaient écrits dans le dossier de sortie
+    bibliotheque = entete['bibliotheque'] if entete else os.path.dirname(os.path.abspath(fichier_plan))
+    
+    compteurs = {'deplace': 0, 'autres': 0, 'erreur': 0}
+    echecs = []
+    dossiers_crees = set()
+    idx = 0
+    catalogue = Catalogue(bibliotheque) if cataloguer else None
+    
+    # Le plan est lu par lots : aucune extraction de métadonnées, seulement des déplacements
+    try:
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            entrees = lire_plan(fichier_plan)
+            while True:
+                lot = list(islice(entrees, taille_lot))
+                if not lot:
+                    break
+                resultats = executor.map(lambda entree: appliquer_entree(entree, dossiers_crees), lot)
+                for entree, result in zip(lot, resultats):
+                    compteurs[result] += 1
+                    if result == 'erreur':
+                        echecs.append(entree)
+                    elif catalogue:
+                        catalogue.ajouter(entree)
+                    idx += 1
+                    if progress_callback:
+                        progress_callback(idx, total_fichiers)
+    finally:
+        if catalogue:
+            catalogue.fermer()
+    
+    rapport = formater_rapport(total_fichiers, compteurs['deplace'], compteurs['autres'], compteurs['erreur'])
+    # Le plan appliqué est archivé : il ne sera ni réappliqué ni proposé dans l'aperçu des miniatures.
+    # Les entrées en échec restent sous le nom d'origine, dans un plan résiduel qui peut être réappliqué
+    os.replace(fichier_plan, fichier_plan + APPLIED_PLAN_SUFFIX)
+    rapport += f"Plan archivé vers : {fichier_plan + APPLIED_PLAN_SUFFIX}\n"
+    if echecs:
+        with open(fichier_plan, 'w', encoding='utf-8') as plan:
+            plan.write(json.dumps({'bibliotheque': bibliotheque}, ensure_ascii=False) + "\n")
+            for entree in echecs:
+                plan.write(json.dumps(entree, ensure_ascii=False) + "\n")
+        rapport += f"Entrées en échec conservées dans : {fichier_plan}\n"
+    logging.info(f"Plan appliqué : {fichier_plan}\n" + rapport)
+    return rapport
+
+# --- Catalogue de la Bibliothèque ---
+CATALOG_FILE = 'catalogue.sqlite'
+
+CATALOG_SCHEMA = """
+CREATE TABLE IF NOT EXISTS photos (
+    chemin TEXT PRIMARY KEY,
+    dossier TEXT NOT NULL,
+    nom TEXT NOT NULL,
+    date_prise TEXT,
+    appareil TEXT,
+    latitude REAL,
+    longitude REAL,
+    taille INTEGER,
+    mtime INTEGER,
+    hash TEXT,
+    chemin_original TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_photos_dossier ON photos (dossier);
+CREATE INDEX IF NOT EXISTS idx_photos_date ON photos (date_prise);
+CREATE INDEX IF NOT EXISTS idx_photos_appareil ON photos (appareil);
+CREATE INDEX IF NOT EXISTS idx_photos_gps ON photos (latitude, longitude);
+CREATE INDEX IF NOT EXISTS idx_photos_taille ON photos (taille);
+CREATE INDEX IF NOT EXISTS idx_photos_hash ON photos (hash);
+CREATE INDEX IF NOT EXISTS idx_photos_original ON photos (chemin_original);
+CREATE TABLE IF NOT EXISTS dossiers (
+    chemin TEXT PRIMARY KEY,
+    mtime INTEGER NOT NULL
+);
+"""
+
+class Catalogue:
+    # Index SQLite de la bibliothèque triée ; les chemins sont relatifs au dossier de sortie
+    def __init__(self, dossier_sortie, taille_lot=500):
+        self.dossier_sortie = dossier_sortie
+        self.taille_lot = taille_lot
+        self.lot = []
+        os.makedirs(dossier_sortie, exist_ok=True)
+        self.connexion = sqlite3.connect(os.path.join(dossier_sortie, CATALOG_FILE), timeout=30)
+        # WAL : plusieurs travaux vers la même destination peuvent écrire sans bloquer les lectures
+        self.connexion.execute('PRAGMA journal_mode=WAL')
+        self.connexion.executescript(CATALOG_SCHEMA)
+
+    def ajouter(self, entree):
+        self.ajouter_fichier(entree['destination'], entree, chemin_original=entree['source'])
+
+    def ajouter_fichier(self, chemin_fichier, metadonnees, chemin_original=None, stat=None):
+        chemin = os.path.relpath(chemin_fichier, self.dossier_sortie)
+        # Un fichier hors de la bibliothèque n'a pas sa place dans ce catalogue
+        if chemin == os.pardir or chemin.startswith(os.pardir + os.sep):
+            logging.error(f"Fichier hors du dossier de sortie {self.dossier_sortie}, non catalogué : {chemin_fichier}")
+            return
+        stat = stat or os.stat(chemin_fichier)
+        date_prise = metadonnees.get('date_prise')
+        if isinstance(date_prise, datetime):
+            date_prise = date_prise.strftime('%Y-%m-%d %H:%M:%S')
+        self.lot.append((
+            chemin, os.path.dirname(chemin) or '.', os.path.basename(chemin), date_prise,
+            metadonnees.get('appareil'), metadonnees.get('latitude'), metadonnees.get('longitude'),
+            stat.st_size, stat.st_mtime_ns, metadonnees.get('hash'), chemin_original,
+        ))
+        if len(self.lot) >= self.taille_lot:
+            self.valider()
+
+    def valider(self):
+        # Le lot en attente et les autres modifications en cours sont validés dans une seule transaction
+        with self.connexion:
+            self.connexion.executemany("""
+                INSERT INTO photos (chemin, dossier, nom, date_prise, appareil, latitude, longitude,
+                                    taille, mtime, hash, chemin_original)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (chemin) DO UPDATE SET
+                    date_prise = excluded.date_prise, appareil = excluded.appareil,
+                    latitude = excluded.latitude, longitude = excluded.longitude,
+                    taille = excluded.taille, mtime = excluded.mtime, hash = excluded.hash,
+                    chemin_original = COALESCE(excluded.chemin_original, photos.chemin_original)
+            """, self.lot)
+        self.lot.clear()
+
+    def requete(self, sql, parametres=()):
+        self.valider()
+        return self.connexion.execute(sql, parametres).fetchall()
+
+    def fermer(self):
+        self.valider()
+        self.connexion.close()
+
+def completer_hashes(catalogue):
+    # Les empreintes ne sont pas calculées pendant le tri : celles restées vides sont complétées ici
+    catalogue.valider()
+    connexion = catalogue.connexion
+    manquants = connexion.execute('SELECT chemin FROM photos WHERE hash IS NULL').fetchall()
+    completes = 0
+    for (chemin,) in manquants:
+        try:
+            empreinte = calculer_hash(os.path.join(catalogue.dossier_sortie, chemin))
+        except OSError:
+            continue
+        connexion.execute('UPDATE photos SET hash = ? WHERE chemin = ?', (empreinte, chemin))
+        completes += 1
+        if completes % catalogue.taille_lot == 0:
+            connexion.commit()
+    connexion.commit()
+    return completes
+
+def synchroniser_catalogue(dossier_sortie, catalogue=None, completer_hash=True):
+    # Un dossier dont la date de modification n'a pas changé depuis la dernière synchronisation
+    # n'a ni gagné ni perdu de fichier : son contenu n'est pas relu
+    fermer = catalogue is None
+    if catalogue is None:
+        catalogue = Catalogue(dossier_sortie)
+    connexion = catalogue.connexion
+    connus = dict(connexion.execute('SELECT chemin, mtime FROM dossiers'))
+    ajoutes = mis_a_jour = supprimes = inchanges = hashes = 0
+    vus = set()
+    
+    try:
+        for racine, _, fichiers in os.walk(dossier_sortie):
+            dossier = os.path.relpath(racine, dossier_sortie)
+            vus.add(dossier)
+            mtime_dossier = os.stat(racine).st_mtime_ns
+            if connus.get(dossier) == mtime_dossier:
+                inchanges += 1
+                continue
+            
+            existants = {
+                nom: (taille, mtime) for nom, taille, mtime in
+                connexion.execute('SELECT nom, taille, mtime FROM photos WHERE dossier = ?', (dossier,))
+            }
+            presents = set()
+            for fichier in fichiers:
+                if os.path.splitext(fichier)[1].lower() not in SUPPORTED_TYPES:
+                    continue
+                chemin = os.path.join(racine, fichier)
+                try:
+                    stat = os.stat(chemin)
+                except FileNotFoundError:
+                    # Supprimé pendant le parcours : traité comme disparu
+                    continue
+                presents.add(fichier)
+                if existants.get(fichier) == (stat.st_size, stat.st_mtime_ns):
+                    continue
+                metadonnees = extraire_metadonnees(chemin)
+                metadonnees['date_prise'] = metadonnees['date_prise'] or extraire_date_nom_fichier(fichier)
+                catalogue.ajouter_fichier(chemin, metadonnees, stat=stat)
+                if fichier in existants:
+                    mis_a_jour += 1
+                else:
+                    ajoutes += 1
+            
+            disparus = set(existants) - presents
+            connexion.executemany('DELETE FROM photos WHERE dossier = ? AND nom = ?',
+                                  [(dossier, nom) for nom in disparus])
+            supprimes += len(disparus)
+            connexion.execute('INSERT OR REPLACE INTO dossiers (chemin, mtime) VALUES (?, ?)', (dossier, mtime_dossier))
+        
+        # Dossiers disparus du disque, y compris ceux créés par un tri et jamais encore synchronisés
+        catalogue.valider()
+        catalogues = {dossier for (dossier,) in connexion.execute('SELECT DISTINCT dossier FROM photos')}
+        for dossier in (catalogues | set(connus)) - vus:
+            supprimes += connexion.execute('DELETE FROM photos WHERE dossier = ?', (dossier,)).rowcount
+            connexion.execute('DELETE FROM dossiers WHERE chemin = ?', (dossier,))
+        catalogue.valider()
+        if completer_hash:
+            hashes = completer_hashes(catalogue)
+    finally:
+        if fermer:
+            catalogue.fermer()
+    
+    rapport = (
+        f"Catalogue synchronisé : {ajoutes} ajoutés, {mis_a_jour} mis à jour, {supprimes} supprimés, "
+        f"{inchanges} dossiers inchangés, {hashes} empreintes complétées\n"
+    )
+    logging.info(rapport)
+    return rapport
+
+# --- Planification de Travaux Multi-Sources ---
+def identifier_peripherique(chemin):
+    # Le dossier de sortie peut ne pas encore exister : on remonte jusqu'au premier parent existant
+    chemin = os.path.abspath(chemin)
+    while not os.path.exists(chemin):
+        parent = os.path.dirname(chemin)
+        if parent == chemin:
+            break
+        chemin = parent
+    return os.stat(chemin).st_dev
+
+class PlanificateurTri:
+    # File de travaux (une source vers une destination) exécutés en parallèle. Les lectures et les écritures
+    # sont limitées séparément par périphérique (st_dev) : `limite_lecture` travaux au plus lisent un même
+    # périphérique source et `limite_ecriture` travaux au plus écrivent sur un même périphérique de
+    # destination. Par défaut, une seule source par disque et une seule écriture par disque de bibliothèque,
+    # pour ne pas faire travailler un disque mécanique en accès concurrents ; une bibliothèque sur SSD
+    # peut accepter une limite d'écriture plus élevée
+    def __init__(self, limite_lecture=1, limite_ecriture=1, progress_callback=None, callback_etat=None):
+        self.limite_lecture = limite_lecture
+        self.limite_ecriture = limite_ecriture
+        self.progress_callback = progress_callback
+        self.callback_etat = callback_etat
+        self.reserves = set()  # Index des noms de destination partagé par tous les travaux
+        self.travaux = []
+        self.en_attente = []
+        self.lectures = {}  # st_dev -> nombre de travaux lisant ce périphérique
+        self.ecritures = {}  # st_dev -> nombre de travaux écrivant sur ce périphérique
+        self.exports_demandes = set()
+        self.condition = threading.Condition()
+
+    def ajouter(self, dossier_entree, dossier_sortie, **options):
+        travail = {
+            'id': len(self.travaux) + 1,
+            'entree': dossier_entree,
+            'sortie': dossier_sortie,
+            'options': options,
+            'peripherique_source': identifier_peripherique(dossier_entree),
+            'peripherique_destination': identifier_peripherique(dossier_sortie),
+            'etat': 'en attente',
+            'progression': (0, 0),
+            'statistiques': {},
+            'rapport': None,
+            'fini': False,
+        }
+        # Un plan par travail, horodaté pour ne jamais écraser celui d'une file précédente
+        if options.get('dry_run') and not options.get('fichier_plan'):
+            horodatage = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+            options['fichier_plan'] = os.path.join(dossier_sortie, f"plan_tri_{horodatage}_{travail['id']}.jsonl")
+        # L'export CSV est fait une seule fois par destination, quand son dernier travail se termine
+        if options.pop('exporter_csv', False):
+            self.exports_demandes.add(dossier_sortie)
+        with self.condition:
+            self.travaux.append(travail)
+            self.en_attente.append(travail)
+            self.lancer_disponibles()
+        self.notifier_etat(False)
+        return travail['id']
+
+    def lancer_disponibles(self):
+        # Appelé sous self.condition ; les travaux sont examinés dans l'ordre d'ajout
+        for travail in list(self.en_attente):
+            source, destination = travail['peripherique_source'], travail['peripherique_destination']
+            if (self.lectures.get(source, 0) < self.limite_lecture
+                    and self.ecritures.get(destination, 0) < self.limite_ecriture):
+                self.en_attente.remove(travail)
+                self.lectures[source] = self.lectures.get(source, 0) + 1
+                self.ecritures[destination] = self.ecritures.get(destination, 0) + 1
+                travail['etat'] = 'en cours'
+                # Threads non démons : la fermeture de l'application attend la fin des déplacements en cours
+                threading.Thread(target=self.executer, args=(travail,)).start()
+
+    def executer(self, travail):
+        def update_progress(current, total):
+            travail['progression'] = (current, total)
+            if self.progress_callback:
+                self.progress_callback(*self.progression())
         
-        if optimiser and extension.lower() in SUPPORTED_IMAGE_TYPES:
-            # Optimiser l'image avant de la déplacer
-            chemin_temp = chemin_nouveau_fichier + ".tmp"
-            optimiser_image(chemin_complet, chemin_temp)
-            chemin_nouveau_fichier = chemin_temp
+        try:
+            travail['rapport'] = trier_photos(
+                travail['entree'], travail['sortie'], progress_callback=update_progress,
+                reserves=self.reserves, statistiques=travail['statistiques'], **travail['options']
+            )
+            travail['etat'] = 'terminé'
+        except Exception as e:
+            logging.error(f"Erreur lors du travail {travail['entree']} vers {travail['sortie']} : {e}")
+            travail['rapport'] = f"Erreur : {e}\n"
+            travail['etat'] = 'erreur'
         
-        if dry_run:
-            logging.info(f"Simulé : déplacer {chemin_complet} vers {chemin_nouveau_fichier}")
-        else:
+        try:
+            with self.condition:
+                self.lectures[travail['peripherique_source']] -= 1
+                self.ecritures[travail['peripherique_destination']] -= 1
+                dernier = travail['sortie'] in self.exports_demandes and not any(
+                    t['sortie'] == travail['sortie'] and t['etat'] in ('en attente', 'en cours') for t in self.travaux
+                )
+                if dernier:
+                    self.exports_demandes.discard(travail['sortie'])
+                self.lancer_disponibles()
+            
+            if dernier:
+                fichier_csv = os.path.join(travail['sortie'], 'exif_data.csv')
+                try:
+                    exporter_exif(travail['sortie'], fichier_csv)
+                    travail['rapport'] += f"Les données EXIF ont été exportées vers : {fichier_csv}\n"
+                except Exception as e:
+                    logging.error(f"Erreur lors de l'export EXIF vers {fichier_csv} : {e}")
+                    travail['rapport'] += f"Erreur lors de l'export EXIF : {e}\n"
+        finally:
+            # La fin de la file n'est constatée qu'une fois, par le dernier travail à se terminer
+            with self.condition:
+                travail['fini'] = True
+                file_terminee = self.termine()
+                self.condition.notify_all()
+            self.notifier_etat(file_terminee)
+
+    def notifier_etat(self, file_terminee):
+        if self.callback_etat:
+            self.callback_etat(self, file_terminee)
+
+    def termine(self):
+        return all(t['fini'] for t in self.travaux)
+
+    def attendre(self, timeout=None):
+        with self.condition:
+            return self.condition.wait_for(self.termine, timeout)
+
+    def progression(self):
+        courant = sum(t['progression'][0] for t in self.travaux)
+        total = sum(t['progression'][1] for t in self.travaux)
+        return courant, total
+
+    def rapport_combine(self):
+        totaux = {'total': 0, 'deplaces': 0, 'autres': 0, 'erreurs': 0}
+        lignes = []
+        for travail in self.travaux:
+            lignes.append(f"Travail {travail['id']} [{travail['etat']}] : {travail['entree']} -> {travail['sortie']}\n")
+            if travail['rapport']:
+                lignes.append(travail['rapport'])
+            for cle in totaux:
+                totaux[cle] += travail['statistiques'].get(cle, 0)
+        if len(self.travaux) > 1:
+            lignes.append("--- Total ---\n")
+            lignes.append(formater_rapport(totaux['total'], totaux['deplaces'], totaux['autres'], totaux['erreurs']))
+        return "".join(lignes)
+
+# --- Cache de Miniatures ---
+THUMBNAIL_CACHE_DIR = 'cache_miniatures'
+
+def cle_contenu(chemin_fichier, taille_bloc=64 * 1024):
+    # Empreinte du contenu (taille, début et fin du fichier), indépendante du nom et de l'emplacement
+    sha1 = hashlib.sha1()
+    taille = os.path.getsize(chemin_fichier)
+    sha1.update(str(taille).encode())
+    with open(chemin_fichier, 'rb') as f:
+        sha1.update(f.read(taille_bloc))
+        if taille > taille_bloc:
+            f.seek(max(taille_bloc, taille - taille_bloc))
+            sha1.update(f.read(taille_bloc))
+    return sha1.hexdigest()
+
+def orienter_image(img, orientation):
+    transpositions = getattr(Image, 'Transpose', Image)
+    methodes = {
+        2: transpositions.FLIP_LEFT_RIGHT,
+        3: transpositions.ROTATE_180,
+        4: transpositions.FLIP_TOP_BOTTOM,
+        5: transpositions.TRANSPOSE,
+        6: transpositions.ROTATE_270,
+        7: transpositions.TRANSVERSE,
+        8: transpositions.ROTATE_90,
+    }
+    return img.transpose(methodes[orientation]) if orientation in methodes else img
+
+def extraire_miniature_exif(img):
+    try:
+        ifd1 = img.getexif().get_ifd(ExifTags.IFD.IFD1)
+        debut = ifd1.get(0x0201)  # JPEGInterchangeFormat
+        longueur = ifd1.get(0x0202)  # JPEGInterchangeFormatLength
+        if debut and longueur:
+            # Les décalages sont relatifs à l'en-tête TIFF, qui suit le préfixe "Exif\0\0"
+            donnees = img.info['exif']
+            if donnees.startswith(b'Exif'):
+                donnees = donnees[6:]
+            miniature = Image.open(io.BytesIO(donnees[debut:debut + longueur]))
+            miniature.load()
+            return miniature
+    except Exception:
+        pass
+    return None
+
+def generer_miniature(chemin_source, chemin_miniature, taille=(128, 128)):
+    with Image.open(chemin_source) as img:
+        orientation = img.getexif().get(274, 1)  # Orientation
+        miniature = extraire_miniature_exif(img)
+        if miniature is None:
+            # Décodage réduit (JPEG) : bien plus rapide qu'un décodage pleine résolution
+            img.draft('RGB', taille)
+            img.thumbnail(taille)
+            miniature = img
+        miniature.thumbnail(taille)
+        miniature = orienter_image(miniature.convert('RGB'), orientation)
+    # Nom temporaire unique : deux fichiers identiques (même clé) peuvent être traités en même temps
+    descripteur, chemin_temp = tempfile.mkstemp(suffix='.tmp', dir=os.path.dirname(chemin_miniature))
+    try:
+        with os.fdopen(descripteur, 'wb') as f:
+            miniature.save(f, 'JPEG', quality=80)
+        os.replace(chemin_temp, chemin_miniature)
+    except Exception:
+        os.remove(chemin_temp)
+        raise
+
+class CacheMiniatures:
+    # Miniatures indexées par contenu, évincées par ancienneté d'utilisation au-delà du budget
+    def __init__(self, dossier_cache=THUMBNAIL_CACHE_DIR, budget=200 * 1024 * 1024, taille=(128, 128), max_workers=4):
+        self.dossier_cache = dossier_cache
+        self.budget = budget
+        self.taille = taille
+        self.index = OrderedDict()  # clé -> taille en octets, du moins au plus récemment utilisé
+        self.total = 0
+        self.verrou = threading.RLock()
+        self.en_cours = {}
+        self.demandeurs = {}  # source -> nombre de tuiles qui attendent sa miniature
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        os.makedirs(dossier_cache, exist_ok=True)
+        self.charger_index()
+
+    def chemin_miniature(self, cle):
+        return os.path.join(self.dossier_cache, cle[:2], cle + '.jpg')
+
+    def charger_index(self):
+        # L'ordre d'utilisation est reconstitué à partir des dates de modification, mises à jour à chaque accès
+        miniatures = []
+        for racine, _, noms in os.walk(self.dossier_cache):
+            for nom in noms:
+                if nom.endswith('.jpg'):
+                    stat = os.stat(os.path.join(racine, nom))
+                    miniatures.append((stat.st_mtime, nom[:-4], stat.st_size))
+        for _, cle, taille in sorted(miniatures):
+            self.index[cle] = taille
+            self.total += taille
+        self.evincer()
+
+    def obtenir(self, chemin_source):
+        cle = cle_contenu(chemin_source)
+        chemin = self.chemin_miniature(cle)
+        with self.verrou:
+            present = cle in self.index
+            if present:
+                self.index.move_to_end(cle)
+        if present:
             try:
-                shutil.move(chemin_complet, chemin_nouveau_fichier)
-                logging.info(f"Déplacé : {chemin_complet} vers {chemin_nouveau_fichier}")
-                return 'deplace'
-            except Exception as e:
-                logging.error(f"Erreur lors du déplacement de {chemin_complet} : {e}")
-                return 'erreur'
+                os.utime(chemin)
+                return chemin
+            except OSError:
+                with self.verrou:
+                    self.total -= self.index.pop(cle, 0)
+        
+        os.makedirs(os.path.dirname(chemin), exist_ok=True)
+        generer_miniature(chemin_source, chemin, self.taille)
+        with self.verrou:
+            if cle not in self.index:
+                self.index[cle] = os.path.getsize(chemin)
+                self.total += self.index[cle]
+            self.evincer()
+        return chemin
+
+    def evincer(self):
+        with self.verrou:
+            while self.total > self.budget and len(self.index) > 1:
+                cle, taille = self.index.popitem(last=False)
+                self.total -= taille
+                try:
+                    os.remove(self.chemin_miniature(cle))
+                except OSError:
+                    pass
+
+    def demander(self, chemin_source):
+        # Génération en arrière-plan ; une même source n'est jamais demandée deux fois en parallèle.
+        # Chaque appel doit être suivi d'un appel à abandonner() si le résultat n'est plus attendu
+        with self.verrou:
+            self.demandeurs[chemin_source] = self.demandeurs.get(chemin_source, 0) + 1
+            future = self.en_cours.get(chemin_source)
+            if future is None:
+                future = self.executor.submit(self.obtenir, chemin_source)
+                self.en_cours[chemin_source] = future
+                future.add_done_callback(lambda f: self.terminer(chemin_source, f))
+        return future
+
+    def terminer(self, chemin_source, future):
+        with self.verrou:
+            if self.en_cours.get(chemin_source) is future:
+                del self.en_cours[chemin_source]
+                self.demandeurs.pop(chemin_source, None)
+
+    def abandonner(self, chemin_source):
+        # La génération n'est annulée que lorsque plus aucun demandeur (d'aucune fenêtre) ne l'attend
+        with self.verrou:
+            restants = self.demandeurs.get(chemin_source, 0) - 1
+            if restants > 0:
+                self.demandeurs[chemin_source] = restants
+                return
+            self.demandeurs.pop(chemin_source, None)
+            future = self.en_cours.get(chemin_source)
+        if future is not None:
+            future.cancel()
+
+    def fermer(self):
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+def regrouper_pour_apercu(dossier_sortie, fichier_plan=None):
+    # Images déjà triées (par dossier) et, si un plan existe, images planifiées (par dossier de destination)
+    groupes = {}
+    for racine, _, fichiers in os.walk(dossier_sortie):
+        for fichier in fichiers:
+            if os.path.splitext(fichier)[1].lower() in SUPPORTED_IMAGE_TYPES:
+                libelle = os.path.relpath(racine, dossier_sortie)
+                groupes.setdefault(libelle, []).append(os.path.join(racine, fichier))
+    
+    # Sans plan explicite, on lit tous les plans de la destination (un par travail planifié)
+    if fichier_plan is None:
+        fichiers_plan = sorted(glob.glob(os.path.join(dossier_sortie, 'plan_tri*.jsonl')))
     else:
-        chemin_autres = os.path.join(dossier_sortie, "Autres", fichier)
-        if dry_run:
-            logging.info(f"Simulé : déplacer {chemin_complet} vers {chemin_autres}")
-        else:
-            try:
-                shutil.move(chemin_complet, chemin_autres)
-                logging.info(f"Déplacé dans 'Autres' : {chemin_complet}")
-                return 'autres'
-            except Exception as e:
-                logging.error(f"Erreur lors du déplacement de {chemin_complet} vers 'Autres' : {e}")
-                return 'erreur'
+        fichiers_plan = [fichier_plan] if os.path.exists(fichier_plan) else []
+    for fichier_plan in fichiers_plan:
+        for entree in lire_plan(fichier_plan):
+            if os.path.splitext(entree['source'])[1].lower() in SUPPORTED_IMAGE_TYPES:
+                libelle = os.path.relpath(os.path.dirname(entree['destination']), dossier_sortie)
+                groupes.setdefault(f"Plan : {libelle}", []).append(entree['source'])
+    
+    for chemins in groupes.values():
+        chemins.sort()
+    return groupes
 
 # --- Undo / Restauration des Fichiers ---
 HISTORY_FILE = 'historique_moves.json'
@@ -238,7 +943,7 @@ def restaurer_fichiers():
         destination = mouvement['destination']
         try:
             shutil.move(destination, original)
-            logging.info(f"Restauré : {destination} vers {original}")
+            journal_fichiers.info("Restauré : %s vers %s", destination, original)
         except Exception as e:
             logging.error(f"Erreur lors de la restauration de {destination} : {e}")
             erreurs += 1
@@ -252,14 +957,259 @@ def restaurer_fichiers():
         return f"Restaurations terminées avec {erreurs} erreurs."
 
 # --- Configuration du Logging ---
-def configurer_logging():
-    logging.basicConfig(
-        filename='tri_photos.log',
-        level=logging.INFO,
-        format='%(asctime)s - %(levelname)s - %(message)s'
-    )
+LOG_FILE = 'tri_photos.log'
+LOG_FORMAT = '%(asctime)s - %(levelname)s - %(message)s'
+
+class FiltreEchantillonnage(logging.Filter):
+    # Ne conserve qu'un enregistrement sur `taux` sous `niveau_min` ; les avertissements et erreurs passent toujours
+    def __init__(self, taux=100, niveau_min=logging.WARNING):
+        super().__init__()
+        self.taux = max(1, taux)
+        self.niveau_min = niveau_min
+        self.compteur = count()
+
+    def filter(self, record):
+        if record.levelno >= self.niveau_min:
+            return True
+        return next(self.compteur) % self.taux == 0
+
+class TamponJournal(logging.Handler):
+    # Conserve les dernières lignes formatées dans un tampon circulaire pour la vue du journal
+    def __init__(self, capacite=10000):
+        super().__init__()
+        self.lignes = deque(maxlen=capacite)
+        self.total = 0
+
+    def emit(self, record):
+        try:
+            ligne = self.format(record)
+        except Exception:
+            self.handleError(record)
+            return
+        with self.lock:
+            self.lignes.extend(ligne.splitlines() or [''])
+            self.total += 1
+
+    def fenetre(self, debut, nombre):
+        with self.lock:
+            return len(self.lignes), list(islice(self.lignes, debut, debut + nombre))
+
+tampon_journal = TamponJournal()
+
+def configurer_logging(fichier_log=LOG_FILE, taille_max=10 * 1024 * 1024, nb_sauvegardes=5, taux_echantillonnage=100):
+    # Les workers ne font que déposer les enregistrements dans une file ; l'écriture se fait dans un thread dédié
+    file_journal = queue.Queue(-1)
+    formatter = logging.Formatter(LOG_FORMAT)
+    
+    gestionnaire_fichier = RotatingFileHandler(fichier_log, maxBytes=taille_max, backupCount=nb_sauvegardes,
+                                               encoding='utf-8')
+    gestionnaire_fichier.setFormatter(formatter)
+    tampon_journal.setFormatter(formatter)
+    
+    racine = logging.getLogger()
+    racine.setLevel(logging.INFO)
+    racine.addHandler(QueueHandler(file_journal))
+    
+    # L'échantillonnage a lieu avant la file, les lignes écartées ne coûtent donc presque rien
+    journal_fichiers.addFilter(FiltreEchantillonnage(taux_echantillonnage))
+    
+    listener = QueueListener(file_journal, gestionnaire_fichier, tampon_journal, respect_handler_level=True)
+    listener.start()
+    return listener
 
 # --- Interface Graphique avec Tkinter ---
+class VueJournal(ttk.Frame):
+    # N'affiche que les lignes visibles du tampon : mémoire et coût de rendu restent constants
+    def __init__(self, parent, tampon, hauteur=10, intervalle=250):
+        super().__init__(parent)
+        self.tampon = tampon
+        self.hauteur = hauteur
+        self.intervalle = intervalle
+        self.debut = 0
+        self.suivre = True  # Rester positionné sur les dernières lignes
+        self.dernier_rendu = None
+        
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.defiler)
+        self.scrollbar.pack(side='right', fill='y')
+        self.texte = tk.Text(self, height=hauteur, wrap='none', state='disabled')
+        self.texte.pack(side='left', fill='both', expand=True)
+        self.texte.bind('<MouseWheel>', lambda event: self.deplacer(-3 if event.delta > 0 else 3))
+        self.texte.bind('<Button-4>', lambda event: self.deplacer(-3))
+        self.texte.bind('<Button-5>', lambda event: self.deplacer(3))
+        self.after(self.intervalle, self.rafraichir)
+    
+    def defiler(self, action, valeur, unite=None):
+        if action == 'moveto':
+            self.positionner(int(float(valeur) * len(self.tampon.lignes)))
+        elif action == 'scroll':
+            pas = self.hauteur if unite == 'pages' else 1
+            self.deplacer(int(valeur) * pas)
+    
+    def deplacer(self, delta):
+        self.positionner(self.debut + delta)
+        return 'break'
+    
+    def positionner(self, debut):
+        maximum = max(0, len(self.tampon.lignes) - self.hauteur)
+        self.debut = min(max(0, debut), maximum)
+        self.suivre = self.debut >= maximum
+        self.rendre()
+    
+    def rafraichir(self):
+        self.rendre()
+        self.after(self.intervalle, self.rafraichir)
+    
+    def rendre(self):
+        if self.suivre:
+            self.debut = max(0, len(self.tampon.lignes) - self.hauteur)
+        etat = (self.tampon.total, self.debut)
+        if etat == self.dernier_rendu:
+            return
+        self.dernier_rendu = etat
+        total, lignes = self.tampon.fenetre(self.debut, self.hauteur)
+        
+        self.texte.configure(state='normal')
+        self.texte.delete(1.0, tk.END)
+        self.texte.insert(tk.END, "\n".join(lignes))
+        self.texte.configure(state='disabled')
+        if total:
+            self.scrollbar.set(self.debut / total, min(1.0, (self.debut + len(lignes)) / total))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+
+class GrilleMiniatures(tk.Toplevel):
+    # Grille à défilement virtuel : seules les tuiles visibles sont créées, demandées au cache et décodées
+    def __init__(self, parent, groupes, cache, titre="Miniatures", taille_tuile=144, intervalle=100):
+        super().__init__(parent)
+        self.title(titre)
+        self.geometry("800x600")
+        self.groupes = groupes
+        self.cache = cache
+        self.taille_tuile = taille_tuile
+        self.intervalle = intervalle
+        self.chemins = []
+        self.colonnes = 0
+        self.generation = 0  # Invalide les résultats arrivés après un changement de groupe ou de disposition
+        self.tuiles = {}  # index -> {'ids': [...], 'image': PhotoImage ou None}
+        self.demandes = {}
+        self.resultats = queue.Queue()
+        
+        self.frame_haut = ttk.Frame(self)
+        self.frame_haut.pack(pady=5, padx=10, fill='x')
+        self.combo_groupes = ttk.Combobox(self.frame_haut, values=sorted(groupes), state='readonly')
+        self.combo_groupes.pack(side='left', fill='x', expand=True)
+        self.combo_groupes.bind('<<ComboboxSelected>>', lambda event: self.selectionner(self.combo_groupes.get()))
+        self.label_nombre = ttk.Label(self.frame_haut)
+        self.label_nombre.pack(side='left', padx=10)
+        
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self.defiler)
+        self.scrollbar.pack(side='right', fill='y')
+        self.canvas = tk.Canvas(self, yscrollcommand=self.scrollbar.set, background='white')
+        self.canvas.pack(side='left', fill='both', expand=True)
+        self.canvas.bind('<Configure>', lambda event: self.rendre())
+        self.canvas.bind('<MouseWheel>', lambda event: self.defiler('scroll', -1 if event.delta > 0 else 1, 'units'))
+        self.canvas.bind('<Button-4>', lambda event: self.defiler('scroll', -1, 'units'))
+        self.canvas.bind('<Button-5>', lambda event: self.defiler('scroll', 1, 'units'))
+        
+        self.protocol('WM_DELETE_WINDOW', self.fermer)
+        if groupes:
+            self.combo_groupes.current(0)
+            self.selectionner(self.combo_groupes.get())
+        self.id_reception = self.after(self.intervalle, self.recevoir)
+    
+    def fermer(self):
+        self.after_cancel(self.id_reception)
+        self.vider()
+        self.destroy()
+    
+    def selectionner(self, libelle):
+        self.chemins = self.groupes.get(libelle, [])
+        self.label_nombre.config(text=str(len(self.chemins)))
+        self.vider()
+        self.canvas.yview_moveto(0)
+        self.rendre()
+    
+    def vider(self):
+        for index in list(self.tuiles):
+            self.retirer_tuile(index)
+        self.generation += 1
+    
+    def defiler(self, *args):
+        self.canvas.yview(*args)
+        self.rendre()
+    
+    def rendre(self):
+        largeur = self.canvas.winfo_width()
+        colonnes = max(1, largeur // self.taille_tuile)
+        if colonnes != self.colonnes:
+            self.colonnes = colonnes
+            self.vider()
+        lignes = -(-len(self.chemins) // colonnes)
+        self.canvas.configure(scrollregion=(0, 0, colonnes * self.taille_tuile, lignes * self.taille_tuile),
+                              yscrollincrement=self.taille_tuile // 4)
+        
+        premiere = int(self.canvas.canvasy(0) // self.taille_tuile)
+        derniere = int(self.canvas.canvasy(self.canvas.winfo_height()) // self.taille_tuile)
+        visibles = set(range(max(0, premiere * colonnes), min(len(self.chemins), (derniere + 1) * colonnes)))
+        
+        for index in set(self.tuiles) - visibles:
+            self.retirer_tuile(index)
+        for index in visibles - set(self.tuiles):
+            self.creer_tuile(index)
+    
+    def position_tuile(self, index):
+        ligne, colonne = divmod(index, self.colonnes)
+        return colonne * self.taille_tuile, ligne * self.taille_tuile
+    
+    def creer_tuile(self, index):
+        x, y = self.position_tuile(index)
+        t = self.taille_tuile
+        ids = [
+            self.canvas.create_rectangle(x + 4, y + 4, x + t - 4, y + t - 20, outline='#cccccc'),
+            self.canvas.create_text(x + t // 2, y + t - 10, text=os.path.basename(self.chemins[index])[:20]),
+        ]
+        self.tuiles[index] = {'ids': ids, 'image': None, 'chemin': self.chemins[index]}
+        self.demander_miniature(index)
+    
+    def demander_miniature(self, index):
+        future = self.cache.demander(self.tuiles[index]['chemin'])
+        self.demandes[index] = future
+        generation = self.generation
+        future.add_done_callback(lambda f: self.resultats.put((generation, index, f)))
+    
+    def retirer_tuile(self, index):
+        tuile = self.tuiles.pop(index)
+        for item in tuile['ids']:
+            self.canvas.delete(item)
+        if self.demandes.pop(index, None) is not None:
+            # Une tuile sortie de l'écran ne doit plus occuper les workers (si personne d'autre ne l'attend)
+            self.cache.abandonner(tuile['chemin'])
+    
+    def recevoir(self):
+        while True:
+            try:
+                generation, index, future = self.resultats.get_nowait()
+            except queue.Empty:
+                break
+            if generation != self.generation or self.demandes.get(index) is not future:
+                continue
+            if future.cancelled():
+                # Annulée alors que la tuile est toujours visible : la miniature est redemandée
+                self.demander_miniature(index)
+                continue
+            self.demandes.pop(index, None)
+            tuile = self.tuiles[index]
+            x, y = self.position_tuile(index)
+            t = self.taille_tuile
+            try:
+                with Image.open(future.result()) as miniature:
+                    tuile['image'] = ImageTk.PhotoImage(miniature)
+                tuile['ids'].append(self.canvas.create_image(x + t // 2, y + (t - 16) // 2, image=tuile['image']))
+            except Exception as e:
+                logging.error(f"Erreur lors de la génération de la miniature de {self.chemins[index]} : {e}")
+                tuile['ids'].append(self.canvas.create_text(x + t // 2, y + (t - 16) // 2, text="?"))
+        self.id_reception = self.after(self.intervalle, self.recevoir)
+
 class Application(tk.Tk):
     def __init__(self):
         super().__init__()
@@ -276,14 +1226,21 @@ class Application(tk.Tk):
                 'min_resolution_label': "Résolution minimale des images (ex: 1920x1080):",
                 'start_sorting': "Démarrer le Tri",
                 'report_label': "Rapport:",
+                'report_tab': "Rapport",
+                'log_tab': "Journal",
                 'language_label': "Langue:",
                 'undo_restore': "Restaurer les Fichiers",
+                'apply_plan': "Appliquer un Plan",
+                'review': "Aperçu des Miniatures",
+                'sync_catalog': "Synchroniser le Catalogue",
                 'export_success': "Les données EXIF ont été exportées vers : {0}",
                 'error_no_input': "Veuillez sélectionner un dossier d'entrée.",
                 'error_no_output': "Veuillez sélectionner un dossier de sortie.",
+                'error_no_images': "Aucune image à afficher dans ce dossier.",
                 'error_invalid_taille': "La taille minimale doit être un nombre positif.",
                 'error_invalid_resolution': "La résolution minimale doit être au format WIDTHxHEIGHT (ex: 1920x1080).",
                 'completed': "Le tri des photos est terminé.",
+                'jobs_running': "Des tris sont en cours. La fenêtre va se fermer et l'application attendra leur fin. Continuer ?",
                 'restored': "Tous les fichiers ont été restaurés avec succès.",
                 'restored_with_errors': "Restaurations terminées avec {0} erreurs.",
             },
@@ -299,19 +1256,31 @@ class Application(tk.Tk):
                 'min_resolution_label': "Minimum image resolution (e.g., 1920x1080):",
                 'start_sorting': "Start Sorting",
                 'report_label': "Report:",
+                'report_tab': "Report",
+                'log_tab': "Log",
                 'language_label': "Language:",
                 'undo_restore': "Restore Files",
+                'apply_plan': "Apply a Plan",
+                'review': "Thumbnail Review",
+                'sync_catalog': "Sync Catalog",
                 'export_success': "EXIF data exported to: {0}",
                 'error_no_input': "Please select an input folder.",
                 'error_no_output': "Please select an output folder.",
+                'error_no_images': "No images to display in this folder.",
                 'error_invalid_taille': "Minimum size must be a positive number.",
                 'error_invalid_resolution': "Minimum resolution must be in WIDTHxHEIGHT format (e.g., 1920x1080).",
                 'completed': "Photo sorting is complete.",
+                'jobs_running': "Sorting jobs are still running. The window will close and the application will wait for them. Continue?",
                 'restored': "All files have been successfully restored.",
                 'restored_with_errors': "Restorations completed with {0} errors.",
             }
         }
         self.current_lang = 'fr'  # Default language
+        self.cache_miniatures = None
+        self.planificateur = None
+        self.fermee = False
+        self.dernier_pourcentage = None
+        self.protocol('WM_DELETE_WINDOW', self.fermer_application)
         self.title(self.langues[self.current_lang]['title'])
         self.geometry("800x700")
         self.resizable(False, False)
@@ -403,12 +1372,35 @@ class Application(tk.Tk):
         self.label_report = ttk.Label(self, text=self.langues[self.current_lang]['report_label'])
         self.label_report.pack(pady=10)
         
-        self.text_report = tk.Text(self, height=15, state='disabled')
-        self.text_report.pack(pady=5, padx=20, fill='both', expand=True)
+        # Rapport et journal partagent la même zone, dans deux onglets
+        self.notebook = ttk.Notebook(self)
+        self.notebook.pack(pady=5, padx=20, fill='both', expand=True)
+        
+        self.text_report = tk.Text(self.notebook, height=15, state='disabled')
+        self.notebook.add(self.text_report, text=self.langues[self.current_lang]['report_tab'])
+        
+        self.vue_journal = VueJournal(self.notebook, tampon_journal, hauteur=15)
+        self.notebook.add(self.vue_journal, text=self.langues[self.current_lang]['log_tab'])
+        
+        # Actions secondaires
+        self.frame_actions = ttk.Frame(self)
+        self.frame_actions.pack(pady=10)
         
         # Bouton Undo / Restaurer
-        self.button_restore = ttk.Button(self, text=self.langues[self.current_lang]['undo_restore'], command=self.restore_files)
-        self.button_restore.pack(pady=10)
+        self.button_restore = ttk.Button(self.frame_actions, text=self.langues[self.current_lang]['undo_restore'], command=self.restore_files)
+        self.button_restore.pack(side='left', padx=5)
+        
+        # Bouton d'application d'un plan produit en mode aperçu
+        self.button_apply_plan = ttk.Button(self.frame_actions, text=self.langues[self.current_lang]['apply_plan'], command=self.apply_plan)
+        self.button_apply_plan.pack(side='left', padx=5)
+        
+        # Aperçu des miniatures du dossier de sortie et du plan
+        self.button_review = ttk.Button(self.frame_actions, text=self.langues[self.current_lang]['review'], command=self.open_review)
+        self.button_review.pack(side='left', padx=5)
+        
+        # Resynchronisation du catalogue avec l'arborescence du dossier de sortie
+        self.button_sync_catalog = ttk.Button(self.frame_actions, text=self.langues[self.current_lang]['sync_catalog'], command=self.sync_catalog)
+        self.button_sync_catalog.pack(side='left', padx=5)
     
     def changer_langue(self, langue):
         if langue not in self.langues:
@@ -427,7 +1419,12 @@ class Application(tk.Tk):
         self.label_min_resolution.config(text=self.langues[self.current_lang]['min_resolution_label'])
         self.button_start.config(text=self.langues[self.current_lang]['start_sorting'])
         self.label_report.config(text=self.langues[self.current_lang]['report_label'])
+        self.notebook.tab(self.text_report, text=self.langues[self.current_lang]['report_tab'])
+        self.notebook.tab(self.vue_journal, text=self.langues[self.current_lang]['log_tab'])
         self.button_restore.config(text=self.langues[self.current_lang]['undo_restore'])
+        self.button_apply_plan.config(text=self.langues[self.current_lang]['apply_plan'])
+        self.button_review.config(text=self.langues[self.current_lang]['review'])
+        self.button_sync_catalog.config(text=self.langues[self.current_lang]['sync_catalog'])
         # Redémarrer l'interface pour appliquer les changements
         self.update_idletasks()
     
@@ -475,32 +1472,43 @@ class Application(tk.Tk):
         else:
             min_resolution = None  # Pas de filtrage par résolution
         
-        # Désactiver le bouton pour éviter les clics multiples
-        self.button_start.config(state='disabled')
-        self.progress['value'] = 0
-        self.text_report.configure(state='normal')
-        self.text_report.delete(1.0, tk.END)
-        self.text_report.configure(state='disabled')
+        # Une nouvelle file est créée quand la précédente est terminée ; sinon le travail rejoint la file en cours
+        if self.planificateur is None or self.planificateur.termine():
+            self.progress['value'] = 0
+            self.planificateur = PlanificateurTri(progress_callback=self.update_progress, callback_etat=self.update_jobs)
         
-        # Lancer le tri dans un thread séparé pour ne pas bloquer l'interface
-        threading.Thread(target=self.run_sorting, args=(
-            dossier_entree, dossier_sortie, format_nom, dry_run, exporter_csv, optimiser, min_taille, min_resolution
-        )).start()
-    
-    def run_sorting(self, dossier_entree, dossier_sortie, format_nom, dry_run, exporter_csv, optimiser, min_taille, min_resolution):
-        def update_progress(current, total):
-            progress_percent = (current / total) * 100
-            self.progress['value'] = progress_percent
-            self.update_idletasks()
-        
-        rapport = trier_photos(
-            dossier_entree, dossier_sortie, format_nom, dry_run, 
-            progress_callback=update_progress, min_taille=min_taille, 
-            min_resolution=min_resolution, exporter_csv=exporter_csv, optimiser=optimiser
+        # Le tri s'exécute dans les threads du planificateur pour ne pas bloquer l'interface
+        self.planificateur.ajouter(
+            dossier_entree, dossier_sortie, format_nom=format_nom, dry_run=dry_run,
+            min_taille=min_taille, min_resolution=min_resolution, exporter_csv=exporter_csv, optimiser=optimiser
         )
+    
+    def planifier_affichage(self, fonction):
+        # Seul le thread de l'interface touche aux widgets ; rien n'est planifié une fois la fenêtre fermée
+        if self.fermee:
+            return
+        try:
+            self.after(0, fonction)
+        except (RuntimeError, tk.TclError):
+            pass
+    
+    def update_progress(self, current, total):
+        # Appelé depuis les threads de travail : seul un changement de pourcentage est transmis à l'interface
+        if total:
+            pourcentage = int((current / total) * 100)
+            if pourcentage != self.dernier_pourcentage:
+                self.dernier_pourcentage = pourcentage
+                self.planifier_affichage(lambda: self.progress.configure(value=pourcentage))
+    
+    def update_jobs(self, planificateur, file_terminee):
+        # Appelé depuis les threads des travaux : l'affichage est confié au thread de l'interface
+        rapport = planificateur.rapport_combine()
+        self.planifier_affichage(lambda: self.show_jobs(rapport, file_terminee))
+    
+    def show_jobs(self, rapport, file_terminee):
         self.afficher_rapport(rapport)
-        messagebox.showinfo("Terminé", self.langues[self.current_lang]['completed'])
-        self.button_start.config(state='normal')
+        if file_terminee:
+            messagebox.showinfo("Terminé", self.langues[self.current_lang]['completed'])
     
     def afficher_rapport(self, texte):
         self.text_report.configure(state='normal')
@@ -508,6 +1516,68 @@ class Application(tk.Tk):
         self.text_report.insert(tk.END, texte)
         self.text_report.configure(state='disabled')
     
+    def apply_plan(self):
+        fichier_plan = filedialog.askopenfilename(filetypes=[("Plan de tri", "*.jsonl"), ("Tous les fichiers", "*.*")])
+        if not fichier_plan:
+            return
+        self.button_start.config(state='disabled')
+        self.button_apply_plan.config(state='disabled')
+        self.progress['value'] = 0
+        threading.Thread(target=self.run_apply_plan, args=(fichier_plan,)).start()
+    
+    def run_apply_plan(self, fichier_plan):
+        try:
+            rapport = appliquer_plan(fichier_plan, progress_callback=self.update_progress)
+            self.afficher_rapport(rapport)
+            messagebox.showinfo("Terminé", self.langues[self.current_lang]['completed'])
+        except Exception as e:
+            # Fichier illisible ou qui n'est pas un plan de tri
+            logging.error(f"Erreur lors de l'application du plan {fichier_plan} : {e}")
+            messagebox.showerror("Erreur", f"{fichier_plan} : {e}")
+        finally:
+            self.button_start.config(state='normal')
+            self.button_apply_plan.config(state='normal')
+
+    
+    def sync_catalog(self):
+        dossier_sortie = self.entry_output.get()
+        if not dossier_sortie:
+            messagebox.showerror("Erreur", self.langues[self.current_lang]['error_no_output'])
+            return
+        threading.Thread(target=lambda: self.afficher_rapport(synchroniser_catalogue(dossier_sortie))).start()
+    
+    def open_review(self):
+        dossier_sortie = self.entry_output.get()
+        if not dossier_sortie:
+            messagebox.showerror("Erreur", self.langues[self.current_lang]['error_no_output'])
+            return
+        # Le parcours de la sortie et la lecture des plans se font hors du thread de l'interface
+        self.button_review.config(state='disabled')
+        def regrouper():
+            groupes = regrouper_pour_apercu(dossier_sortie)
+            # Le cache (et ses workers) est créé à la première utilisation puis partagé entre les fenêtres ;
+            # la construction de son index parcourt tout le dossier du cache, d'où ce thread
+            cache = self.cache_miniatures or CacheMiniatures()
+            self.after(0, lambda: self.show_review(groupes, cache))
+        threading.Thread(target=regrouper, daemon=True).start()
+    
+    def show_review(self, groupes, cache):
+        self.button_review.config(state='normal')
+        self.cache_miniatures = cache
+        if not groupes:
+            messagebox.showerror("Erreur", self.langues[self.current_lang]['error_no_images'])
+            return
+        GrilleMiniatures(self, groupes, self.cache_miniatures, titre=self.langues[self.current_lang]['review'])
+    
+
+    def fermer_application(self):
+        # Les travaux en cours ne sont pas interrompus en plein déplacement : le programme principal les attend
+        if self.planificateur and not self.planificateur.termine():
+            if not messagebox.askokcancel("Tri en cours", self.langues[self.current_lang]['jobs_running']):
+                return
+        self.fermee = True
+        self.destroy()
+    
     def restore_files(self):
         confirmation = messagebox.askyesno("Restaurer", "Voulez-vous restaurer tous les fichiers déplacés précédemment ?")
         if confirmation:
@@ -517,6 +1587,12 @@ class Application(tk.Tk):
 
 # --- Main ---
 if __name__ == "__main__":
-    configurer_logging()
+    listener = configurer_logging()
     app = Application()
     app.mainloop()
+    if app.planificateur:
+        app.planificateur.attendre()
+    if app.cache_miniatures:
+
+        app.cache_miniatures.fermer()
+    listener.stop()